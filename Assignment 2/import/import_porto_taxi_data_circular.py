@@ -35,6 +35,10 @@ class CircularDomainPortoTaxiDataImporter:
         # SIMPLIFIED: Just track latest trip_ids seen
         self.latest_trip_ids = {}  # trip_id -> latest_row_data
         
+        # taxi_id -> taxi_code, filled by import_taxis; None until optimizeDB.py's
+        # create_taxi_codes has added the taxi_code columns
+        self.taxi_codes = None
+        
         # Statistics
         self.stats = {
             'rows_processed': 0,
@@ -79,6 +83,9 @@ class CircularDomainPortoTaxiDataImporter:
         # Step 3: Process any remaining batches
         self._flush_remaining_batches()
         
+        # Only once every batch is committed, so a failed run does not mark derived results stale
+        self._bump_etl_version()
+        
         end_time = time.time()
         self._print_final_statistics(start_time, end_time)
 
@@ -104,19 +111,51 @@ class CircularDomainPortoTaxiDataImporter:
         print("Inserting taxis into database...")
         taxi_list = sorted(list(taxi_ids))
         
+        self.taxi_codes = self._load_taxi_codes()
+        if self.taxi_codes is not None:
+            # New taxis get the next free codes here, read once instead of per row; a plain INSERT
+            # so a code already taken fails on uq_taxis_code instead of being shared
+            taxi_list = [taxi_id for taxi_id in taxi_list if taxi_id not in self.taxi_codes]
+            next_code = max((code for code in self.taxi_codes.values() if code is not None), default=0) + 1
+            for offset, taxi_id in enumerate(taxi_list):
+                self.taxi_codes[taxi_id] = next_code + offset
+        
         for i in range(0, len(taxi_list), self.batch_size):
             batch = taxi_list[i:i + self.batch_size]
             
-            values = [(taxi_id,) for taxi_id in batch]
-            self.cursor.executemany(
-                "INSERT INTO taxis (taxi_id) VALUES (%s) ON DUPLICATE KEY UPDATE taxi_id = taxi_id",
-                values
-            )
+            if self.taxi_codes is not None:
+                values = [(taxi_id, self.taxi_codes[taxi_id]) for taxi_id in batch]
+                self.cursor.executemany(
+                    "INSERT INTO taxis (taxi_id, taxi_code) VALUES (%s, %s)",
+                    values
+                )
+            else:
+                values = [(taxi_id,) for taxi_id in batch]
+                self.cursor.executemany(
+                    "INSERT INTO taxis (taxi_id) VALUES (%s) ON DUPLICATE KEY UPDATE taxi_id = taxi_id",
+                    values
+                )
             self.db_connection.commit()
             print(f"Inserted batch {i//self.batch_size + 1} of taxis ({len(batch)} items)")
 
         print(f"Imported {len(taxi_ids)} unique taxis")
 
+    def _load_taxi_codes(self):
+        """
+        Read the taxi_id -> taxi_code dictionary, or None if taxis and gps_points
+        have no taxi_code columns yet
+        """
+        self.cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name IN ('taxis', 'gps_points')
+        AND column_name = 'taxi_code'
+        """)
+        if self.cursor.fetchone()[0] < 2:
+            return None
+        self.cursor.execute("SELECT taxi_id, taxi_code FROM taxis")
+        return dict(self.cursor.fetchall())
+
     def import_trips_with_circular_domains(self, csv_file_path):
         """
         Import trips with JSON polyline and circular domain generation
@@ -348,9 +387,10 @@ class CircularDomainPortoTaxiDataImporter:
                     
                     for idx, (lon, lat) in enumerate(polyline):
                         point_timestamp = start_epoch + idx * self.TIME_PER_POINT
-                        gps_points_batch.append((
-                            trip_id, taxi_id, idx, lat, lon, point_timestamp
-                        ))
+                        point = (trip_id, taxi_id, idx, lat, lon, point_timestamp)
+                        if self.taxi_codes is not None:
+                            point += (self.taxi_codes[taxi_id],)
+                        gps_points_batch.append(point)
                         
                         # Insert when batch reaches size limit
                         if len(gps_points_batch) >= GPS_BATCH_SIZE:
@@ -413,16 +453,40 @@ class CircularDomainPortoTaxiDataImporter:
                     print("Could not rollback - connection may be lost")
                 raise
 
+    def _bump_etl_version(self):
+        """
+        Bump the 'gps_points' version in etl_state so cached results derived from the GPS
+        data (gps_pair_summary in optimizeDB.py) are recomputed
+        """
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS etl_state (
+            name VARCHAR(64) PRIMARY KEY,
+            version BIGINT UNSIGNED NOT NULL
+        )
+        """)
+        self.cursor.execute("""
+        INSERT INTO etl_state (name, version) VALUES ('gps_points', 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+        """)
+        self.db_connection.commit()
+
     def _insert_gps_points_sub_batch(self, gps_points_batch):
         """Insert GPS points with retry logic - SIMPLIFIED: no call_type"""
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                self.cursor.executemany("""
-                INSERT INTO gps_points (trip_id, taxi_id, point_index, latitude, longitude, point_timestamp)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE point_timestamp = point_timestamp
-                """, gps_points_batch)
+                if self.taxi_codes is not None:
+                    self.cursor.executemany("""
+                    INSERT INTO gps_points (trip_id, taxi_id, point_index, latitude, longitude, point_timestamp, taxi_code)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE point_timestamp = point_timestamp
+                    """, gps_points_batch)
+                else:
+                    self.cursor.executemany("""
+                    INSERT INTO gps_points (trip_id, taxi_id, point_index, latitude, longitude, point_timestamp)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE point_timestamp = point_timestamp
+                    """, gps_points_batch)
                 self.db_connection.commit()
                 return  # Success
             except mysql.connector.errors.OperationalError as e:
@@ -1,10 +1,218 @@
 import sys
 import os
+import hashlib
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+from mysql.connector import Error as MySQLError, errorcode
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from DbConnector import DbConnector
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # Without numba the kernels run as plain Python (same results, much slower)
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+def _save_parquet(path, rows):
+    """Write a list of flat dicts as a ZSTD-compressed, dictionary-encoded Parquet file."""
+    if pq is None:
+        raise RuntimeError("pyarrow is required to write Parquet output")
+    pq.write_table(pa.Table.from_pylist(rows), str(path),
+                   compression="zstd", use_dictionary=True, row_group_size=100_000)
+    return path
+
+
+@njit(cache=True)
+def _sweep_pairs(ts, lat, lon, taxi, first, last, out_i, out_j):
+    """
+    Sliding ±5 s window over points sorted by timestamp. For every t1 point in [first, last) the
+    two window edges only move forward, so each point is compared with the few dozen points of
+    its window instead of being probed through an index. Returns the number of matches
+    (t2.taxi_id > t1.taxi_id, inside the lat/lon box); pass empty out arrays to only count,
+    or arrays of that length to also record the (t1, t2) row indices.
+    """
+    n = ts.shape[0]
+    fill = out_i.shape[0] > 0
+    lo = 0
+    hi = 0
+    k = 0
+    for i in range(first, last):
+        while ts[lo] < ts[i] - 5:
+            lo += 1
+        while hi < n and ts[hi] <= ts[i] + 5:
+            hi += 1
+        for j in range(lo, hi):
+            if (taxi[j] > taxi[i] and abs(lat[j] - lat[i]) <= PROXIMITY_LAT_DELTA
+                    and abs(lon[j] - lon[i]) <= PROXIMITY_LON_DELTA):
+                if fill:
+                    out_i[k] = i
+                    out_j[k] = j
+                k += 1
+    return k
+
+
+def _plan_stats(plan):
+    """
+    Pull the numbers the proximity strategy choice needs out of an EXPLAIN FORMAT=JSON document:
+    rows processed summed over all nodes, the measured total time in ms (EXPLAIN ANALYZE only)
+    and the optimizer's query cost.
+    Inner sides of nested loops report rows per loop, so each node is weighted by how often it
+    ran: with EXPLAIN ANALYZE actual_rows is multiplied by actual_loops; with plain EXPLAIN a
+    table's rows_examined_per_scan is multiplied by the rows produced by the tables joined
+    before it, which is how many times it is scanned.
+    """
+    stats = {"rows": 0.0,
+             "time_ms": plan.get("actual_last_row_ms"),
+             "cost": plan.get("query_block", {}).get("cost_info", {}).get("query_cost")}
+
+    def walk(node, scans=1.0):
+        if isinstance(node, list):
+            for value in node:
+                walk(value, scans)
+        elif isinstance(node, dict):
+            if "actual_rows" in node:
+                stats["rows"] += float(node["actual_rows"]) * float(node.get("actual_loops", 1))
+            if "rows_examined_per_scan" in node:
+                stats["rows"] += float(node["rows_examined_per_scan"]) * scans
+            for key, value in node.items():
+                if key == "nested_loop":
+                    # rows_produced_per_join is cumulative, so it is the scan count of the next table
+                    prefix = 1.0
+                    for entry in value:
+                        walk(entry, prefix)
+                        prefix = float(entry.get("table", {}).get("rows_produced_per_join", prefix))
+                elif key == "table":
+                    walk(value, scans)
+                else:
+                    walk(value)
+
+    walk(plan)
+    return stats
+
+
+def _histogram_fraction(histogram, lo, hi):
+    """
+    Fraction of rows with lo <= value <= hi according to a MySQL 8 histogram (the JSON stored in
+    information_schema.COLUMN_STATISTICS). Equi-height buckets are [lower, upper, cumulative
+    frequency, distinct values] and are interpolated linearly; singleton buckets are [value,
+    cumulative frequency].
+    """
+    fraction, previous = 0.0, 0.0
+    for bucket in histogram["buckets"]:
+        if histogram["histogram-type"] == "singleton":
+            value, cumulative = bucket
+            if lo <= value <= hi:
+                fraction += cumulative - previous
+        else:
+            lower, upper, cumulative = bucket[:3]
+            overlap = min(upper, hi) - max(lower, lo) + 1
+            if overlap > 0:
+                fraction += (cumulative - previous) * overlap / (upper - lower + 1)
+        previous = cumulative
+    return fraction
+
+
+# The proximity workload covers one day (2014-06-01 UTC); it is run in hour-sized windows of t1
+# so each window is its own small index range scan and its own small GROUP BY
+PROXIMITY_DAY_START = 1401580800
+PROXIMITY_CHUNK_SECONDS = 3600
+# Equirectangular scaling at Porto's latitude: a degree of longitude is cos(41.15°) of a degree
+# of latitude, so the longitude tolerance is the latitude one divided by that cosine (the old
+# hard-coded 0.00007 assumed ~44°)
+PORTO_COS_LAT = math.cos(math.radians(41.15))
+PROXIMITY_LAT_DELTA = 0.00005
+PROXIMITY_LON_DELTA = PROXIMITY_LAT_DELTA / PORTO_COS_LAT
+# Distance refinement after the lat/lon box, in metres; every strategy applies the same
+# equirectangular check, (dlat * METERS_PER_DEG_LAT)^2 + (dlon * METERS_PER_DEG_LON)^2 < 5^2
+PROXIMITY_DISTANCE_M = 5.0
+METERS_PER_DEG_LAT = 111320.0
+METERS_PER_DEG_LON = METERS_PER_DEG_LAT * PORTO_COS_LAT
+# Strategy choice from one measured hour: stay in MySQL while the whole day is cheap, otherwise
+# offload to a DuckDB bucketed hash join (or the client-side sweep when duckdb is not installed)
+MYSQL_DAY_BUDGET_MS = 60_000
+MYSQL_DAY_BUDGET_ROWS = 50_000_000
+PROXIMITY_PAIRS_QUERY = """
+WITH spatial_filtered AS (
+    SELECT 
+        t1.taxi_code AS taxi1,
+        t2.taxi_code AS taxi2,
+        t1.point_timestamp AS ts1,
+        t2.point_timestamp AS ts2,
+        t1.latitude AS lat1,
+        t1.longitude AS lon1,
+        t2.latitude AS lat2,
+        t2.longitude AS lon2
+    -- Each t1 point looks up its own and the 26 neighbouring (time, lat, lon) buckets by
+    -- equality on idx_gps_bucket_code; the exact ±5 s / lat / lon window then refines the candidates
+    FROM gps_points t1
+    CROSS JOIN (SELECT -1 AS d UNION ALL SELECT 0 UNION ALL SELECT 1) dt
+    CROSS JOIN (SELECT -1 AS d UNION ALL SELECT 0 UNION ALL SELECT 1) dlat
+    CROSS JOIN (SELECT -1 AS d UNION ALL SELECT 0 UNION ALL SELECT 1) dlon
+    JOIN gps_points t2
+        ON t2.ts_bucket = t1.ts_bucket + dt.d
+        AND t2.lat_cell = t1.lat_cell + dlat.d
+        AND t2.lon_cell = t1.lon_cell + dlon.d
+    -- Each unordered pair once; the output is oriented on taxi_id below
+    WHERE t2.taxi_code > t1.taxi_code
+        AND t2.point_timestamp BETWEEN t1.point_timestamp - 5 AND t1.point_timestamp + 5
+        AND t2.latitude BETWEEN t1.latitude - %(lat_delta)s AND t1.latitude + %(lat_delta)s
+        AND t2.longitude BETWEEN t1.longitude - %(lon_delta)s AND t1.longitude + %(lon_delta)s
+        AND POW((t2.latitude - t1.latitude) * %(m_per_deg_lat)s, 2)
+            + POW((t2.longitude - t1.longitude) * %(m_per_deg_lon)s, 2) < %(distance_sq)s
+        AND t1.point_timestamp >= %(lo)s AND t1.point_timestamp < %(hi)s
+)
+-- Group on the narrow codes; only the grouped pairs are mapped back to taxi ids. Codes of taxis
+-- added after create_taxi_codes are not in taxi_id order, so taxi1 < taxi2 is restored here
+SELECT LEAST(d1.taxi_id, d2.taxi_id), GREATEST(d1.taxi_id, d2.taxi_id), p.n
+FROM (SELECT taxi1, taxi2, COUNT(*) AS n FROM spatial_filtered GROUP BY taxi1, taxi2) p
+JOIN taxis d1 ON d1.taxi_code = p.taxi1
+JOIN taxis d2 ON d2.taxi_code = p.taxi2
+"""
+
+
+def _pairs_params(lo, hi):
+    """Bind values for PROXIMITY_PAIRS_QUERY: the t1 window, the box tolerances and the distance check."""
+    return {"lo": lo, "hi": hi, "lat_delta": PROXIMITY_LAT_DELTA, "lon_delta": PROXIMITY_LON_DELTA,
+            "m_per_deg_lat": METERS_PER_DEG_LAT, "m_per_deg_lon": METERS_PER_DEG_LON,
+            "distance_sq": PROXIMITY_DISTANCE_M ** 2}
+
+
+def _sql_literal(value):
+    """Quote a value as a SQL string literal (single quotes doubled)."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _pair_summary_state_name():
+    """
+    etl_state row holding the GPS version gps_pair_summary was built from. The proximity
+    parameters are hashed into the name, so changing any of them also makes the summary stale.
+    """
+    params = json.dumps({"day_start": PROXIMITY_DAY_START, "lat_delta": PROXIMITY_LAT_DELTA,
+                         "lon_delta": PROXIMITY_LON_DELTA, "distance_m": PROXIMITY_DISTANCE_M},
+                        sort_keys=True)
+    return "gps_pair_summary:" + hashlib.sha1(params.encode()).hexdigest()[:16]
+
+
 class CircularDomainDatabaseSetup:
     """
     Sets up the circular domain-based database schema with JSON polyline storage
@@ -50,6 +258,7 @@ class CircularDomainDatabaseSetup:
         
         # Tables to drop (in dependency order)
         tables_to_drop = [
+            'gps_pair_summary', # Derived from gps_points (see refresh_pair_summary)
             'TripDomainH3',     # Drop first (has foreign keys)
             'Trips',            # Drop second
             'trip_points',      # Drop third
@@ -326,41 +535,164 @@ class CircularDomainDatabaseSetup:
         """
         self.connection.close_connection()
 
-    def create_optimized_indexes_for_proximity(self):
+    def create_taxi_codes(self):
         """
-        Add optimized indexes for the proximity query.
-        These are critical for performance!
+        Dictionary-encode taxi_id as a dense SMALLINT UNSIGNED taxi_code.
+        The taxis table is the dictionary; codes are (re)assigned in taxi_id order. gps_points
+        carries the code so the proximity indexes are 2 bytes narrower per entry.
+        Rows imported afterwards get their codes from the importer, which assigns the next free code
+        to each new taxi and copies it onto that taxi's GPS points; uq_taxis_code makes a collision
+        fail the insert instead of silently sharing a code.
         """
-        print("Creating optimized indexes for proximity queries...")
-        
-        # 1. Composite index for the join condition (MOST IMPORTANT)
+        print("Creating taxi codes...")
+
+        def column_exists(table, column):
+            self.cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.columns
+                WHERE table_schema = DATABASE()
+                AND table_name = %s
+                AND column_name = %s
+            """, (table, column))
+            return self.cursor.fetchone()[0] > 0
+
+        # Triggers from earlier versions of this script did a lookup per inserted GPS row and raced on
+        # MAX(taxi_code) + 1; the importer fills the codes now
+        self.cursor.execute("DROP TRIGGER IF EXISTS trg_taxis_code")
+        self.cursor.execute("DROP TRIGGER IF EXISTS trg_gps_points_taxi_code")
+
+        # gps_points.taxi_code is made NOT NULL last, so that means a previous run completed
         self.cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_gps_taxi_time_spatial 
-            ON gps_points(taxi_id, point_timestamp, latitude, longitude)
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+            AND table_name = 'gps_points'
+            AND column_name = 'taxi_code'
+            AND is_nullable = 'NO'
         """)
-        print("✓ Created composite index: taxi_id, point_timestamp, latitude, longitude")
-        
-        # 2. Additional index for timestamp range queries
+        if self.cursor.fetchone()[0] > 0:
+            print("taxi_code already exists on taxis and gps_points")
+            return
+
+        if not column_exists("taxis", "taxi_code"):
+            self.cursor.execute("""
+                ALTER TABLE taxis
+                ADD COLUMN taxi_code SMALLINT UNSIGNED NULL,
+                ADD UNIQUE INDEX uq_taxis_code (taxi_code)
+            """)
+        # Cleared first so renumbering cannot collide with a code still held by another taxi
+        self.cursor.execute("UPDATE taxis SET taxi_code = NULL")
         self.cursor.execute("""
-            CREATE INDEX idx_gps_timestamp_taxi 
-            ON gps_points(point_timestamp, taxi_id)
+            UPDATE taxis t
+            JOIN (SELECT taxi_id, ROW_NUMBER() OVER (ORDER BY taxi_id) AS code FROM taxis) r
+                USING (taxi_id)
+            SET t.taxi_code = r.code
         """)
-        print("✓ Created index: point_timestamp, taxi_id")
+
+        if not column_exists("gps_points", "taxi_code"):
+            self.cursor.execute("ALTER TABLE gps_points ADD COLUMN taxi_code SMALLINT UNSIGNED NULL")
+        self.cursor.execute("""
+            UPDATE gps_points g
+            JOIN taxis t USING (taxi_id)
+            SET g.taxi_code = t.taxi_code
+        """)
+        self.cursor.execute("ALTER TABLE gps_points MODIFY taxi_code SMALLINT UNSIGNED NOT NULL")
+
+        self.db_connection.commit()
+        print("✓ Created taxi_code on taxis and gps_points")
+
+    def enable_parallel_ddl(self):
+        """
+        Let this session build secondary indexes in parallel (MySQL 8.0.27+): the scan, sort and
+        merge phases of an in-place B-tree build are spread over innodb_ddl_threads, each sorting in
+        its share of innodb_ddl_buffer_size.
+        """
+        try:
+            self.cursor.execute("SET SESSION innodb_ddl_threads = 8")
+            self.cursor.execute("SET SESSION innodb_ddl_buffer_size = 1024 * 1024 * 1024")
+            self.cursor.execute("SET SESSION innodb_parallel_read_threads = 8")
+            print("✓ Parallel index build enabled (8 DDL threads)")
+        except Exception as e:
+            print(f"Could not enable parallel index build: {e}")
+
+
+    def create_optimized_indexes_for_proximity(self):
+        """
+        Add optimized indexes for the proximity query.
+        These are critical for performance!
+        """
+        print("Creating optimized indexes for proximity queries...")
+        self.enable_parallel_ddl()
         
-        # 3. Spatial index if you want to use MySQL spatial types (optional but helpful)
-        # First, check if we can add a computed spatial column
+        def index_exists(index_name):
+            self.cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE()
+                AND table_name = 'gps_points'
+                AND index_name = %s
+            """, (index_name,))
+            return self.cursor.fetchone()[0] > 0
+
+        # 1. Covering index for the time-window side of the join (MOST IMPORTANT).
+        # The join has no taxi equality (only t2.taxi_code > t1.taxi_code), so point_timestamp must lead;
+        # taxi_code/latitude/longitude ride along so the outer scan never goes back to the clustered rows.
+        # Requires create_taxi_codes to have run first.
+        # It replaces the old (taxi_id, point_timestamp, lat, lon) composite, which the range could not
+        # use, and (point_timestamp, taxi_id), which is now a redundant prefix.
+        # gps_points is deliberately not PARTITION BY RANGE(point_timestamp): InnoDB does not allow
+        # partitioned tables with foreign keys (trip_id, taxi_id) or SPATIAL indexes (idx_gps_spatial),
+        # and the primary key would have to include point_timestamp. A day window is instead one
+        # contiguous range in this index, which touches the same pages partition pruning would.
+        for old_index in ("idx_gps_taxi_time_spatial", "idx_gps_timestamp_taxi", "idx_gps_time_covering"):
+            if index_exists(old_index):
+                self.cursor.execute(f"DROP INDEX {old_index} ON gps_points")
+                print(f"✓ Dropped redundant index {old_index}")
+        if not index_exists("idx_gps_time_code_covering"):
+            self.cursor.execute("""
+                CREATE INDEX idx_gps_time_code_covering
+                ON gps_points(point_timestamp, taxi_code, latitude, longitude)
+                ALGORITHM=INPLACE LOCK=NONE
+            """)
+        print("✓ Created covering index: point_timestamp, taxi_code, latitude, longitude")
+    
+        # 2. Spatial index on a stored POINT column (optional). The proximity query itself runs on the
+        # bucket equi-join (create_proximity_buckets) and does not read it; it is kept for ad-hoc
+        # MBRContains / ST_Distance lookups. MySQL 8 only uses a SPATIAL index when the column is
+        # NOT NULL and SRID-restricted, so a nullable / SRID-less point_geom is rebuilt.
         try:
             self.cursor.execute("""
-                ALTER TABLE gps_points 
-                ADD COLUMN IF NOT EXISTS point_geom POINT AS 
-                    (POINT(longitude, latitude)) STORED
+                SELECT COUNT(*) FROM gps_points WHERE latitude IS NULL OR longitude IS NULL
             """)
-            
+            if self.cursor.fetchone()[0] > 0:
+                raise ValueError("gps_points has rows without latitude/longitude; point_geom cannot be NOT NULL")
+
             self.cursor.execute("""
-                CREATE SPATIAL INDEX IF NOT EXISTS idx_gps_spatial 
-                ON gps_points(point_geom)
+                SELECT IS_NULLABLE, SRS_ID FROM information_schema.columns
+                WHERE table_schema = DATABASE()
+                AND table_name = 'gps_points'
+                AND column_name = 'point_geom'
             """)
-            print("✓ Created spatial index on point_geom")
+            column = self.cursor.fetchone()
+            if column is not None and (column[0] == "YES" or column[1] is None):
+                if index_exists("idx_gps_spatial"):
+                    self.cursor.execute("DROP INDEX idx_gps_spatial ON gps_points")
+                self.cursor.execute("ALTER TABLE gps_points DROP COLUMN point_geom")
+                print("✓ Dropped nullable / SRID-less point_geom")
+                column = None
+            if column is None:
+                self.cursor.execute("""
+                    ALTER TABLE gps_points
+                    ADD COLUMN point_geom POINT
+                        GENERATED ALWAYS AS (POINT(longitude, latitude)) STORED NOT NULL SRID 0
+                """)
+
+            if not index_exists("idx_gps_spatial"):
+                # InnoDB builds SPATIAL indexes in place but cannot allow concurrent writes while doing so
+                self.cursor.execute("""
+                    CREATE SPATIAL INDEX idx_gps_spatial
+                    ON gps_points(point_geom)
+                    ALGORITHM=INPLACE LOCK=SHARED
+                """)
+
+            print("✓ Created spatial index on point_geom (POINT NOT NULL SRID 0)")
         except Exception as e:
             print(f"  Note: Spatial index not created: {e}")
         
@@ -371,54 +703,362 @@ class CircularDomainDatabaseSetup:
    
 
 
+    def create_proximity_buckets(self):
+        """
+        Add grid-bucket columns so the proximity self-join becomes an equi-join.
+        A point is bucketed by 5 s of time and by one lat/lon tolerance cell, so any
+        pair within ±5 s / ±PROXIMITY_LAT_DELTA / ±PROXIMITY_LON_DELTA sits in the same or an adjacent bucket.
+        """
+        print("Creating grid buckets for proximity queries...")
+        self.enable_parallel_ddl()
+
+        self.cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+            AND table_name = 'gps_points'
+            AND column_name = 'ts_bucket'
+        """)
+        if self.cursor.fetchone()[0] == 0:
+            self.cursor.execute(f"""
+                ALTER TABLE gps_points
+                ADD COLUMN ts_bucket INT UNSIGNED
+                    GENERATED ALWAYS AS (point_timestamp DIV 5) STORED NOT NULL,
+                ADD COLUMN lat_cell INT
+                    GENERATED ALWAYS AS (FLOOR(latitude / {PROXIMITY_LAT_DELTA:.10f})) STORED NOT NULL,
+                ADD COLUMN lon_cell INT
+                    GENERATED ALWAYS AS (FLOOR(longitude / {PROXIMITY_LON_DELTA:.10f})) STORED NOT NULL
+            """)
+            print("✓ Created bucket columns: ts_bucket, lat_cell, lon_cell")
+        else:
+            print("Bucket columns already exist on gps_points")
+
+        # Keyed on taxi_code (see create_taxi_codes); replaces the taxi_id version of the index
+        self.cursor.execute("""
+            SELECT index_name FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+            AND table_name = 'gps_points'
+            AND index_name IN ('idx_gps_bucket', 'idx_gps_bucket_code')
+        """)
+        existing = {row[0] for row in self.cursor.fetchall()}
+        if "idx_gps_bucket" in existing:
+            self.cursor.execute("DROP INDEX idx_gps_bucket ON gps_points")
+        if "idx_gps_bucket_code" not in existing:
+            self.cursor.execute("""
+                CREATE INDEX idx_gps_bucket_code
+                ON gps_points(ts_bucket, lat_cell, lon_cell, taxi_code)
+                ALGORITHM=INPLACE LOCK=NONE
+            """)
+        print("✓ Created bucket index: ts_bucket, lat_cell, lon_cell, taxi_code")
+
+        self.db_connection.commit()
+
+
     def analyze_query_performance(self):
         """
-        Run EXPLAIN to see query execution plan
-        """
-        explain_query = """
-        EXPLAIN 
-        WITH spatial_filtered AS (
-            SELECT 
-                t1.taxi_id AS taxi1,
-                t2.taxi_id AS taxi2,
-                t1.point_timestamp AS ts1,
-                t2.point_timestamp AS ts2,
-                t1.latitude AS lat1,
-                t1.longitude AS lon1,
-                t2.latitude AS lat2,
-                t2.longitude AS lon2
-            FROM gps_points t1
-            INNER JOIN gps_points t2 
-                ON t2.taxi_id > t1.taxi_id
-                AND t2.point_timestamp BETWEEN t1.point_timestamp - 5 AND t1.point_timestamp + 5
-                AND t2.latitude BETWEEN t1.latitude - 0.00005 AND t1.latitude + 0.00005
-                AND t2.longitude BETWEEN t1.longitude - 0.00007 AND t1.longitude + 0.00007
-            WHERE t1.point_timestamp BETWEEN 1401580800 AND 1401667199
-        )
-        SELECT taxi1, taxi2, COUNT(*) FROM spatial_filtered GROUP BY taxi1, taxi2
+        Run EXPLAIN ANALYZE FORMAT=JSON on one hour of the proximity query and return its plan stats.
+        EXPLAIN ANALYZE really executes the hour, so that hour's work is done twice when the MySQL
+        strategy is then chosen. Servers without JSON EXPLAIN ANALYZE (MySQL < 8.3) fall back to the
+        estimate-only EXPLAIN FORMAT=JSON; any other error is raised.
         """
-        
-        self.cursor.execute(explain_query)
-        results = self.cursor.fetchall()
-        
-        print("\nQuery Execution Plan:")
+        # Explain one representative window; every chunk runs the same plan
+        window = _pairs_params(PROXIMITY_DAY_START, PROXIMITY_DAY_START + PROXIMITY_CHUNK_SECONDS)
+        try:
+            self.cursor.execute("EXPLAIN ANALYZE FORMAT=JSON " + PROXIMITY_PAIRS_QUERY, window)
+        except MySQLError as e:
+            # ER_NOT_SUPPORTED_YET: no JSON format for EXPLAIN ANALYZE; ER_PARSE_ERROR: no EXPLAIN
+            # ANALYZE at all (< 8.0.18). A parse error in the query itself fails again below.
+            if e.errno not in (errorcode.ER_NOT_SUPPORTED_YET, errorcode.ER_PARSE_ERROR):
+                raise
+            print(f"EXPLAIN ANALYZE FORMAT=JSON not supported ({e.msg}); using estimate-only EXPLAIN")
+            self.cursor.execute("EXPLAIN FORMAT=JSON " + PROXIMITY_PAIRS_QUERY, window)
+        plan = json.loads(self.cursor.fetchone()[0])
+        stats = _plan_stats(plan)
+
+        print("\nQuery Execution Plan (one hour):")
         print("-" * 80)
-        for row in results:
-            print(row)
+        print(f"  Rows:      {stats['rows']:,.0f}")
+        print(f"  Time (ms): {stats['time_ms'] if stats['time_ms'] is not None else 'n/a (estimate only)'}")
+        print(f"  Cost:      {stats['cost'] if stats['cost'] is not None else 'n/a'}")
         print("-" * 80)
+        return stats
+
+
+    def run_proximity(self):
+        """
+        Run the proximity pair count with the strategy the measured plan favours:
+        MySQL hour chunks while a day of them fits the budget, otherwise DuckDB or the sweep.
+        """
+        stats = self.analyze_query_performance()
+        hours = 86400 // PROXIMITY_CHUNK_SECONDS
+        day_rows = stats["rows"] * hours
+        day_ms = stats["time_ms"] * hours if stats["time_ms"] is not None else None
+
+        if day_rows <= MYSQL_DAY_BUDGET_ROWS and (day_ms is None or day_ms <= MYSQL_DAY_BUDGET_MS):
+            print("Strategy: MySQL hour chunks")
+            return self.run_proximity_by_hour()
+        if duckdb is not None:
+            print("Strategy: DuckDB bucketed hash join")
+            return self.run_proximity_duckdb_hash_join()
+        print("Strategy: client-side sweep")
+        return self.run_proximity_sweep()
+
+
+    def run_proximity_by_hour(self, out_path=Path(__file__).parent / "proximity_pairs.parquet"):
+        """
+        Count close encounters per taxi pair for the whole day, one hour of t1 at a time.
+        Summing the per-hour counts equals UNION ALL-ing the windows and grouping once.
+        The result is written to out_path as Parquet, sorted by (taxi1, taxi2).
+        """
+        pair_counts = {}
+        # Unbuffered cursor: rows are read off the socket while iterating instead of the whole
+        # result being pulled into client memory first
+        cursor = self.db_connection.cursor(buffered=False)
+        try:
+            for lo in range(PROXIMITY_DAY_START, PROXIMITY_DAY_START + 86400, PROXIMITY_CHUNK_SECONDS):
+                cursor.execute(PROXIMITY_PAIRS_QUERY, _pairs_params(lo, lo + PROXIMITY_CHUNK_SECONDS))
+                for taxi1, taxi2, count in cursor:
+                    pair_counts[(taxi1, taxi2)] = pair_counts.get((taxi1, taxi2), 0) + count
+        finally:
+            cursor.close()
+
+        print(f"\nTaxi pairs within proximity: {len(pair_counts):,}")
+        # Sorted on (taxi1, taxi2) so the leading column run-length/dictionary encodes well
+        rows = [{"taxi1": taxi1, "taxi2": taxi2, "encounters": count}
+                for (taxi1, taxi2), count in sorted(pair_counts.items())]
+        print(f"Saved to {_save_parquet(out_path, rows)}")
+        return pair_counts
+
+
+    def run_proximity_duckdb_hash_join(self, out_path=Path(__file__).parent / "proximity_pairs.parquet"):
+        """
+        Same pair counts as run_proximity_by_hour, computed in DuckDB instead of a MySQL self-join.
+        The day's points are copied out of MySQL once and self-joined with a hash join on adjacent
+        5 s buckets (the ts_bucket key of PROXIMITY_PAIRS_QUERY), so only points close in time are
+        paired before the exact box/distance checks run. A spatial (R-Tree) join was not used: with
+        no time term in its key it would first pair every co-located point of the day (taxi ranks,
+        stations).
+        """
+        if duckdb is None:
+            raise RuntimeError("duckdb is required for run_proximity_duckdb_hash_join")
+
+        day_end = PROXIMITY_DAY_START + 86400
+        con = duckdb.connect()
+        try:
+            con.execute("INSTALL mysql; LOAD mysql;")
+            c = self.connection
+            # Credentials go in a secret as escaped string literals, not spliced into a connection string
+            con.execute(f"""
+                CREATE SECRET src_secret (TYPE mysql, HOST {_sql_literal(c.HOST)}, PORT 3306,
+                    USER {_sql_literal(c.USER)}, PASSWORD {_sql_literal(c.PASSWORD)},
+                    DATABASE {_sql_literal(c.DATABASE)})
+            """)
+            con.execute("ATTACH '' AS src (TYPE mysql, SECRET src_secret, READ_ONLY)")
+            # Without this the scanner does not push the WHERE below down to MySQL and would pull all
+            # of gps_points over the wire
+            con.execute("SET mysql_experimental_filter_pushdown = true")
+            # t2 may lie up to 5 s outside the day, so the copy is padded on both ends. point_timestamp
+            # arrives as UINTEGER, where t1 - t2 would overflow, so it is widened to BIGINT
+            con.execute("""
+                CREATE TABLE gps AS
+                SELECT taxi_id, CAST(point_timestamp AS BIGINT) AS point_timestamp,
+                       CAST(point_timestamp AS BIGINT) // 5 AS ts_bucket,
+                       CAST(latitude AS DOUBLE) AS lat, CAST(longitude AS DOUBLE) AS lon
+                FROM src.gps_points
+                WHERE point_timestamp >= ? AND point_timestamp < ?
+            """, [PROXIMITY_DAY_START - 5, day_end + 5])
+
+            # The box and distance checks are the same predicate as the MySQL query
+            rows = con.execute("""
+                SELECT t1.taxi_id AS taxi1, t2.taxi_id AS taxi2, COUNT(*) AS encounters
+                FROM gps t1
+                CROSS JOIN (VALUES (-1), (0), (1)) dt(d)
+                JOIN gps t2 ON t2.ts_bucket = t1.ts_bucket + dt.d
+                WHERE t2.taxi_id > t1.taxi_id
+                    AND t1.point_timestamp >= ? AND t1.point_timestamp < ?
+                    AND abs(t1.point_timestamp - t2.point_timestamp) <= 5
+                    AND abs(t1.lat - t2.lat) <= ?
+                    AND abs(t1.lon - t2.lon) <= ?
+                    AND pow((t2.lat - t1.lat) * ?, 2) + pow((t2.lon - t1.lon) * ?, 2) < ?
+                GROUP BY 1, 2
+                ORDER BY 1, 2
+            """, [PROXIMITY_DAY_START, day_end,
+                  PROXIMITY_LAT_DELTA, PROXIMITY_LON_DELTA,
+                  METERS_PER_DEG_LAT, METERS_PER_DEG_LON, PROXIMITY_DISTANCE_M ** 2]).fetchall()
+        finally:
+            con.close()
+
+        print(f"\nTaxi pairs within proximity (DuckDB hash join): {len(rows):,}")
+        print(f"Saved to {_save_parquet(out_path, [{'taxi1': t1, 'taxi2': t2, 'encounters': n} for t1, t2, n in rows])}")
+        return {(t1, t2): n for t1, t2, n in rows}
+
+
+    def run_proximity_sweep(self, out_path=Path(__file__).parent / "proximity_pairs.parquet"):
+        """
+        Taxi pair counts computed client-side with a sort-merge sweep; box candidates are refined to
+        PROXIMITY_DISTANCE_M metres as on the SQL paths.
+        The day's points come back already ordered by idx_gps_time_code_covering (index-only scan), and
+        _sweep_pairs replaces the per-row ±5 s range probe with two forward-moving window edges.
+        """
+        day_end = PROXIMITY_DAY_START + 86400
+        # t2 may lie up to 5 s outside the day, so the fetch is padded on both ends
+        self.cursor.execute("SELECT taxi_code, taxi_id FROM taxis WHERE taxi_code IS NOT NULL")
+        taxi_codes = self.cursor.fetchall()
+        taxi_ids = np.zeros(max((code for code, _ in taxi_codes), default=0) + 1, dtype=np.int64)
+        for code, taxi_id in taxi_codes:
+            taxi_ids[code] = taxi_id
+
+        self.cursor.execute("""
+            SELECT taxi_code, point_timestamp, CAST(latitude AS DOUBLE), CAST(longitude AS DOUBLE)
+            FROM gps_points
+            WHERE point_timestamp >= %s AND point_timestamp < %s
+            ORDER BY point_timestamp
+        """, (PROXIMITY_DAY_START - 5, day_end + 5))
+        data = np.array(self.cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+        taxi = data[:, 0].astype(np.int64)
+        ts = data[:, 1].astype(np.int64)
+        lat = np.ascontiguousarray(data[:, 2])
+        lon = np.ascontiguousarray(data[:, 3])
+        first, last = np.searchsorted(ts, [PROXIMITY_DAY_START, day_end])
+
+        # Count first, then fill exactly-sized index arrays
+        empty = np.empty(0, dtype=np.int64)
+        n_pairs = _sweep_pairs(ts, lat, lon, taxi, first, last, empty, empty)
+        out_i = np.empty(n_pairs, dtype=np.int64)
+        out_j = np.empty(n_pairs, dtype=np.int64)
+        _sweep_pairs(ts, lat, lon, taxi, first, last, out_i, out_j)
+
+        # Vectorized distance check on the box candidates: differences are taken in float64 (the
+        # absolute coordinates need it), then the squared-distance arithmetic runs on packed float32
+        dy = ((lat[out_i] - lat[out_j]) * METERS_PER_DEG_LAT).astype(np.float32)
+        dx = ((lon[out_i] - lon[out_j]) * METERS_PER_DEG_LON).astype(np.float32)
+        close = np.nonzero(dy * dy + dx * dx < np.float32(PROXIMITY_DISTANCE_M ** 2))[0]
+        out_i, out_j = out_i[close], out_j[close]
+
+        # Porto has a few hundred taxis, so pair counts fit a dense taxi x taxi matrix: a scatter-add
+        # into it replaces hashing every (taxi1, taxi2) row. taxi_code is dense, so it indexes the
+        # matrix directly. Taxis added after create_taxi_codes get the next free code rather than one
+        # in taxi_id order, so pairs are oriented on taxi_id when they are mapped back
+        counter = np.zeros((len(taxi_ids), len(taxi_ids)), dtype=np.uint32)
+        np.add.at(counter, (taxi[out_i], taxi[out_j]), 1)
+        pair_idx = np.argwhere(counter > 0)
+        pair_counts = {}
+        for a, b in pair_idx:
+            taxi1, taxi2 = sorted((int(taxi_ids[a]), int(taxi_ids[b])))
+            pair_counts[(taxi1, taxi2)] = int(counter[a, b])
+
+        print(f"\nTaxi pairs within proximity (sweep): {len(pair_counts):,}")
+        rows = [{"taxi1": t1, "taxi2": t2, "encounters": n} for (t1, t2), n in sorted(pair_counts.items())]
+        print(f"Saved to {_save_parquet(out_path, rows)}")
+        return pair_counts
 
 
     # PERFORMANCE ANALYSIS HELPER
+    def gps_etl_version(self):
+        """
+        Version of the loaded GPS data: the 'gps_points' counter in etl_state, which the importer
+        (import_porto_taxi_data_circular.py) bumps after every run. Anything else that inserts,
+        updates or deletes GPS points should bump it the same way.
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS etl_state (
+                name VARCHAR(64) PRIMARY KEY,
+                version BIGINT UNSIGNED NOT NULL
+            )
+        """)
+        self.cursor.execute("SELECT version FROM etl_state WHERE name = 'gps_points'")
+        row = self.cursor.fetchone()
+        return row[0] if row else 0
+
+
+    def refresh_pair_summary(self):
+        """
+        Recompute the day's taxi pair counts (run_proximity) and materialize them in
+        gps_pair_summary. The gps_etl_version they were computed from is recorded in etl_state under
+        _pair_summary_state_name().
+        """
+        etl_version = self.gps_etl_version()
+        state_name = _pair_summary_state_name()
+        # Cleared before the table is touched (DDL commits implicitly), so a rebuild that fails
+        # half-way leaves the summary stale rather than trusted
+        self.cursor.execute("DELETE FROM etl_state WHERE name LIKE 'gps\\_pair\\_summary:%'")
+        self.db_connection.commit()
+        pair_counts = self.run_proximity()
+
+        self.cursor.execute("DROP TABLE IF EXISTS gps_pair_summary")
+        self.cursor.execute("""
+            CREATE TABLE gps_pair_summary (
+                taxi1 INT NOT NULL,
+                taxi2 INT NOT NULL,
+                encounters INT UNSIGNED NOT NULL,
+                PRIMARY KEY (taxi1, taxi2)
+            )
+        """)
+        self.cursor.executemany(
+            "INSERT INTO gps_pair_summary (taxi1, taxi2, encounters) VALUES (%s, %s, %s)",
+            [(taxi1, taxi2, count) for (taxi1, taxi2), count in sorted(pair_counts.items())]
+        )
+        self.cursor.execute("INSERT INTO etl_state (name, version) VALUES (%s, %s)", (state_name, etl_version))
+        self.db_connection.commit()
+        print(f"✓ gps_pair_summary refreshed: {len(pair_counts):,} pairs (etl_version {etl_version})")
+        return pair_counts
+
+
+    def proximity_pairs(self):
+        """
+        Taxi pair counts for the day, read from gps_pair_summary. The table is only rebuilt when it
+        is missing, or when the version etl_state records for it (built with the current PROXIMITY_*
+        parameters) differs from the GPS data's. An empty summary is as valid as any other.
+        """
+        self.cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.tables
+            WHERE table_schema = DATABASE()
+            AND table_name = 'gps_pair_summary'
+        """)
+        if self.cursor.fetchone()[0] > 0:
+            etl_version = self.gps_etl_version()
+            self.cursor.execute("SELECT version FROM etl_state WHERE name = %s", (_pair_summary_state_name(),))
+            built_from = self.cursor.fetchone()
+            if built_from is not None and built_from[0] == etl_version:
+                self.cursor.execute("SELECT taxi1, taxi2, encounters FROM gps_pair_summary")
+                pair_counts = {(taxi1, taxi2): count for taxi1, taxi2, count in self.cursor.fetchall()}
+                print(f"\nTaxi pairs within proximity (cached): {len(pair_counts):,}")
+                return pair_counts
+        print("gps_pair_summary is missing or stale, rebuilding...")
+        return self.refresh_pair_summary()
+
+
     def estimate_row_processing(self):
         """
         Estimate how many rows the query will process
         """
-        # Count total GPS points in date range
+        day_last = PROXIMITY_DAY_START + 86400 - 1
+
+        # O(1) cardinality estimate from statistics: table row count times the histogram's share of
+        # the day. Histograms are sampled, so building one does not scan the whole table
+        self.cursor.execute("ANALYZE TABLE gps_points UPDATE HISTOGRAM ON point_timestamp WITH 100 BUCKETS")
+        self.cursor.fetchall()
         self.cursor.execute("""
-            SELECT COUNT(*), COUNT(DISTINCT taxi_id)
-            FROM gps_points
-            WHERE point_timestamp BETWEEN 1401580800 AND 1401667199
+            SELECT s.histogram, t.num_rows
+            FROM information_schema.column_statistics s
+            JOIN information_schema.innodb_tablestats t
+                ON t.name = CONCAT(s.schema_name, '/', s.table_name)
+            WHERE s.schema_name = DATABASE()
+            AND s.table_name = 'gps_points'
+            AND s.column_name = 'point_timestamp'
         """)
+        row = self.cursor.fetchone()
+        if row:
+            histogram, table_rows = row
+            estimated_points = table_rows * _histogram_fraction(json.loads(histogram), PROXIMITY_DAY_START, day_last)
+            print(f"\nHistogram estimate: ~{estimated_points:,.0f} GPS points in range")
+
+        # Exact count, index-only: every column it needs is in the covering index, so no clustered-index
+        # lookups are made
+        self.cursor.execute("""
+            SELECT COUNT(*), COUNT(DISTINCT taxi_code)
+            FROM gps_points USE INDEX (idx_gps_time_code_covering)
+            WHERE point_timestamp BETWEEN %s AND %s
+        """, (PROXIMITY_DAY_START, day_last))
         total_points, unique_taxis = self.cursor.fetchone()
         
         print(f"\nData Statistics:")
@@ -460,7 +1100,12 @@ def main():
             return
         
         setup = CircularDomainDatabaseSetup()
-        # setup.create_optimized_indexes_for_proximity()
+        # Prerequisites of the proximity helpers below (taxi_code, idx_gps_time_code_covering and
+        # the bucket columns); each step skips what already exists
+        setup.create_taxi_codes()
+        setup.create_optimized_indexes_for_proximity()
+        setup.create_proximity_buckets()
+        # setup.refresh_pair_summary()
         setup.analyze_query_performance()
         setup.estimate_row_processing()
         # setup.setup_database()
@@ -16,11 +16,12 @@ class DbConnector:
                  DATABASE='movie_db',
                  HOST="tdt4225-37.idi.ntnu.no",
                  USER="mongoDB",
-                 PASSWORD="gruppe37"):
+                 PASSWORD="gruppe37",
+                 **client_options):
         uri = "mongodb://%s:%s@%s/%s" % (USER, PASSWORD, HOST, DATABASE)
-        # Connect to the databases
+        # Connect to the databases; client_options are passed through to MongoClient (e.g. maxPoolSize)
         try:
-            self.client = MongoClient(uri)
+            self.client = MongoClient(uri, **client_options)
             self.db = self.client[DATABASE]
         except Exception as e:
             print("ERROR: Failed to connect to db:", e)
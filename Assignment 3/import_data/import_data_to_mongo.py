@@ -1,12 +1,17 @@
+import os
 import sys
 import json
 import ast
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
+import numpy as np
 import pandas as pd
-from pymongo import UpdateOne, ASCENDING, DESCENDING, TEXT
+import pyarrow.parquet as pq
+from pymongo import IndexModel, InsertOne, UpdateOne, ASCENDING, DESCENDING, TEXT
 from pymongo.errors import BulkWriteError
 
 # Ensure we can import the provided DbConnector residing one level up
@@ -29,6 +34,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("import_pipeline")
 
+# Minimum seconds between progress log lines in the hot loops
+PROGRESS_INTERVAL_S = 0.5
+
 
 def safe_eval(val: Any) -> Optional[Any]:
     if pd.isna(val):
@@ -49,6 +57,43 @@ def safe_eval(val: Any) -> Optional[Any]:
     return None
 
 
+def _parse_column(values: list) -> list:
+    # Module-level so it can be pickled into ProcessPoolExecutor workers
+    return [safe_eval(v) for v in values]
+
+
+def parse_json_columns(df: pd.DataFrame, columns: List[str], pool: ProcessPoolExecutor,
+                       chunked: tuple = ("cast", "crew")) -> pd.DataFrame:
+    """Parse JSON-like columns of df in place, one worker per column.
+
+    Only distinct non-null cells are parsed (the same studio/collection JSON repeats across many
+    films) and mapped back with a dict lookup. The large cast/crew columns are additionally split
+    row-wise into one chunk per core.
+    """
+    n_chunks = os.cpu_count() or 1
+    futures = {}
+    for col in columns:
+        if col not in df.columns:
+            continue
+        uniq = df[col].dropna().drop_duplicates()
+        if col in chunked and n_chunks > 1:
+            parts = np.array_split(uniq.to_numpy(dtype=object), n_chunks)
+            futures[col] = (uniq, [pool.submit(_parse_column, part.tolist()) for part in parts])
+        else:
+            futures[col] = (uniq, [pool.submit(_parse_column, uniq.tolist())])
+    for col, (uniq, parts) in futures.items():
+        mapping = dict(zip(uniq, (v for f in parts for v in f.result())))
+        df[col] = df[col].map(mapping)
+    return df
+
+
+def _iter_records(df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+    """Yield rows as dicts without materializing the whole frame (cf. iterrows / to_dict("records"))."""
+    cols = df.columns.tolist()
+    for row in zip(*(df[c].to_numpy(copy=False) for c in cols)):
+        yield dict(zip(cols, row))
+
+
 def to_int(value: Any) -> Optional[int]:
     try:
         if pd.isna(value):
@@ -60,6 +105,17 @@ def to_int(value: Any) -> Optional[int]:
         return None
 
 
+def to_int_series(s: pd.Series) -> pd.Series:
+    """Vectorized to_int: a nullable Int64 column in one pass instead of a Python call per row."""
+    return np.trunc(pd.to_numeric(s, errors="coerce")).astype("Int64")
+
+
+def with_valid_id(df: pd.DataFrame, col: str = "id") -> pd.DataFrame:
+    """Coerce df[col] to integers and keep only rows with a usable (non-null, non-zero) id."""
+    ids = to_int_series(df[col])
+    return df.assign(**{col: ids}).loc[ids.notna() & ids.ne(0)]
+
+
 def to_float(value: Any) -> Optional[float]:
     try:
         if pd.isna(value):
@@ -103,44 +159,38 @@ def compact_list_of_dicts(lst: Optional[List[Dict]], keep_keys: List[str]) -> Op
 
 
 def load_links_mapping(data_dir: Path):
-    links_path = data_dir / "links_merged_cleaned.csv"
-    links = pd.read_csv(links_path)
+    links_path = data_dir / "links_merged_cleaned.parquet"
+    links = pd.read_parquet(links_path)
     # Build mapping between MovieLens movieId and TMDB id, and TMDB→IMDb
-    movieId_to_tmdb = {}
-    tmdb_to_imdb = {}
-    for _, r in links.iterrows():
-        ml_id = to_int(r.get("movieId"))
-        tmdb = to_int(r.get("tmdbId"))
-        imdb = to_int(r.get("imdbId"))
-        if ml_id and tmdb:
-            movieId_to_tmdb[ml_id] = tmdb
-        if tmdb and imdb:
-            tmdb_to_imdb[tmdb] = imdb
+    ml_id, tmdb, imdb = (to_int_series(links[c]) for c in ("movieId", "tmdbId", "imdbId"))
+    has_ml, has_tmdb, has_imdb = (ids.notna() & ids.ne(0) for ids in (ml_id, tmdb, imdb))
+    pairs = has_ml & has_tmdb
+    movieId_to_tmdb = dict(zip(ml_id[pairs].astype("int64").tolist(), tmdb[pairs].astype("int64").tolist()))
+    pairs = has_tmdb & has_imdb
+    tmdb_to_imdb = dict(zip(tmdb[pairs].astype("int64").tolist(), imdb[pairs].astype("int64").tolist()))
     return movieId_to_tmdb, tmdb_to_imdb
 
 
-def load_keywords_map(data_dir: Path):
-    kw_path = data_dir / "keywords_cleaned.csv"
-    kw = pd.read_csv(kw_path)
+def load_keywords_map(data_dir: Path, pool: ProcessPoolExecutor):
+    kw_path = data_dir / "keywords_cleaned.parquet"
+    kw = parse_json_columns(with_valid_id(pd.read_parquet(kw_path)), ["keywords"], pool)
     out = {}
-    for _, r in kw.iterrows():
-        tmdb = to_int(r.get("id"))
-        keywords = compact_list_of_dicts(safe_eval(r.get("keywords")), ["id", "name"])
-        if tmdb:
-            out[tmdb] = keywords or []
+    for r in _iter_records(kw):
+        keywords = compact_list_of_dicts(r.get("keywords"), ["id", "name"])
+        out[int(r["id"])] = keywords or []
     return out
 
 
-def load_credits_maps(data_dir: Path):
-    cred_path = data_dir / "credits_cleaned.csv"
-    cred = pd.read_csv(cred_path)
-    cast_map, crew_map = {}, {}
-    for _, r in cred.iterrows():
-        tmdb = to_int(r.get("id"))
-        if not tmdb:
-            continue
-        cast_raw = safe_eval(r.get("cast")) or []
-        crew_raw = safe_eval(r.get("crew")) or []
+def load_credits_map(data_dir: Path, pool: ProcessPoolExecutor):
+    cred_path = data_dir / "credits_cleaned.parquet"
+    cred = parse_json_columns(with_valid_id(pd.read_parquet(cred_path)), ["cast", "crew"], pool)
+    # One entry per movie holding both sides, so the movie build does a single probe for cast + crew
+    credits_map = {}
+    for r in _iter_records(cred):
+        tmdb = int(r["id"])
+        # Unparseable / missing cells come back as None or NaN
+        cast_raw = r.get("cast") if isinstance(r.get("cast"), list) else []
+        crew_raw = r.get("crew") if isinstance(r.get("crew"), list) else []
         cast = []
         for c in cast_raw:
             if isinstance(c, dict):
@@ -159,32 +209,53 @@ def load_credits_maps(data_dir: Path):
                     "job": c.get("job"),
                     "gender": c.get("gender"),
                 })
-        cast_map[tmdb] = cast
-        crew_map[tmdb] = crew
-    return cast_map, crew_map
+        # Store cast in billing order so "top-billed N" is a plain $slice at query time
+        cast.sort(key=lambda c: c["order"] if isinstance(c["order"], int) else float("inf"))
+        credits_map[tmdb] = {"cast": cast, "crew": crew}
+    return credits_map
 
 
-def build_movie_docs(data_dir: Path, tmdb_to_imdb: Dict[int, int], cast_map, crew_map, kw_map):
-    meta_path = data_dir / "movies_metadata_cleaned.csv"
-    meta = pd.read_csv(meta_path, low_memory=False)
+META_JSON_COLUMNS = [
+    "belongs_to_collection", "genres", "spoken_languages", "production_companies", "production_countries",
+]
 
-    docs = []
-    for _, r in meta.iterrows():
-        tmdb = to_int(r.get("id"))
-        if not tmdb:
-            continue
+
+def load_movies_metadata(data_dir: Path, pool: ProcessPoolExecutor) -> pd.DataFrame:
+    meta_path = data_dir / "movies_metadata_cleaned.parquet"
+    meta = with_valid_id(pd.read_parquet(meta_path))
+    return parse_json_columns(meta, META_JSON_COLUMNS, pool)
+
+
+def load_genre_names_map(meta: pd.DataFrame) -> Dict[int, List[str]]:
+    # Genre names per movie, copied onto each rating so per-user genre stats need no join to movies.
+    # Sorted and de-duplicated so movies with the same genre combination carry identical arrays,
+    # which a per-user $addToSet then collapses to one entry
+    out = {}
+    for tmdb, genres in zip(meta["id"], meta["genres"]):
+        out[int(tmdb)] = sorted({g["name"] for g in compact_list_of_dicts(genres, ["name"]) or [] if g.get("name")})
+    return out
+
+
+def build_movie_docs(meta: pd.DataFrame, tmdb_to_imdb: Dict[int, int], credits_map, kw_map) -> Iterator[Dict]:
+    for r in _iter_records(meta):
+        tmdb = int(r["id"])
+        credits = credits_map.get(tmdb, {})
 
         release_date = to_date(r.get("release_date"))
         year = compute_year(release_date)
         decade = compute_decade(year)
 
-        belongs = compact_dict(safe_eval(r.get("belongs_to_collection")), ["id", "name"])
-        genres = compact_list_of_dicts(safe_eval(r.get("genres")), ["id", "name"]) or []
+        keywords = kw_map.get(tmdb, [])
+
+        belongs = compact_dict(r.get("belongs_to_collection"), ["id", "name"])
+        genres = compact_list_of_dicts(r.get("genres"), ["id", "name"]) or []
         primary_genre = genres[0]["name"] if genres else None
 
-        spoken_languages = compact_list_of_dicts(safe_eval(r.get("spoken_languages")), ["iso_639_1", "name"])
-        prod_companies = compact_list_of_dicts(safe_eval(r.get("production_companies")), ["id", "name"])
-        prod_countries = compact_list_of_dicts(safe_eval(r.get("production_countries")), ["iso_3166_1", "name"])
+        spoken_languages = compact_list_of_dicts(r.get("spoken_languages"), ["iso_639_1", "name"])
+        prod_companies = compact_list_of_dicts(r.get("production_companies"), ["id", "name"])
+        prod_countries = compact_list_of_dicts(r.get("production_countries"), ["iso_3166_1", "name"])
+        us_involved = any(c.get("iso_3166_1") == "US" or c.get("name") == "United States of America"
+                          for c in prod_countries or [])
 
         vote_average = to_float(r.get("vote_average"))
         vote_count = to_int(r.get("vote_count"))
@@ -213,128 +284,225 @@ def build_movie_docs(data_dir: Path, tmdb_to_imdb: Dict[int, int], cast_map, cre
             "spoken_languages": spoken_languages,
             "production_companies": prod_companies,
             "production_countries": prod_countries,
-            "cast": cast_map.get(tmdb, []),
-            "crew": crew_map.get(tmdb, []),
-            "keywords": kw_map.get(tmdb, []),
+            # Precomputed so the US-involvement filter is one indexed equality instead of an $or over arrays
+            "us_involved": us_involved,
+            "cast": credits.get("cast", []),
+            "crew": credits.get("crew", []),
+            "keywords": keywords,
             # Resolved numeric IMDb id from links if available
             "imdbId": tmdb_to_imdb.get(tmdb),
         }
-        docs.append(doc)
-    return docs
-
-
-def import_movies(db, movie_docs: List[Dict], *, drop_first: bool = True, batch_size: int = 1000):
-    coll = db["movies"]
+        yield doc
+
+
+def bulk_write_concurrently(coll, ops: Iterable, *, batch_size: int, label: str,
+                            max_workers: int = 32, max_in_flight: int = 64) -> int:
+    """Send ops to coll in unordered batches from a thread pool.
+
+    PyMongo releases the GIL on network I/O, so threads overlap the round-trips; at most
+    max_in_flight batches are pending at once to bound memory.
+    """
+    total, pending = 0, set()
+    last_report = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        def submit(b):
+            nonlocal pending
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    f.result()
+            pending.add(ex.submit(coll.bulk_write, b, ordered=False))
+
+        # islice pulls exactly one batch from the (lazy) ops iterator; only in-flight batches are held
+        it = iter(ops)
+        while batch := list(islice(it, batch_size)):
+            submit(batch)
+            total += len(batch)
+            # Throttle progress output; the final count is always logged below
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL_S:
+                logger.info(f"{label}: {total}")
+                last_report = time.monotonic()
+        for f in pending:
+            f.result()
+    logger.info(f"{label} (final): {total}")
+    return total
+
+
+def import_movies(db, movie_docs: Iterable[Dict], *, drop_first: bool = True, batch_size: int = 50000) -> int:
     if drop_first:
-        coll.drop()
-
-    ops, total = [], 0
-    for doc in movie_docs:
-        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True))
-        if len(ops) >= batch_size:
-            coll.bulk_write(ops, ordered=False)
-            total += len(ops)
-            ops = []
-    if ops:
-        coll.bulk_write(ops, ordered=False)
-        total += len(ops)
-    print(f"Upserted {total} movie documents.")
-
-
-def load_ratings(data_dir: Path, movieId_to_tmdb: Dict[int, int]):
-    ratings_path = data_dir / "ratings_merged_cleaned.csv"
-    ratings = pd.read_csv(ratings_path)
-
-    docs = []
-    rows = ratings.iterrows()
-    if tqdm:
-        rows = tqdm(ratings.iterrows(), total=len(ratings), desc="load_ratings", unit="row")
-
-    for i, r in rows:
-        ml_id = to_int(r.get("movieId"))
-        tmdb = movieId_to_tmdb.get(ml_id)
-        if not tmdb:
-            continue
-        rating = to_float(r.get("rating"))
-        ts = to_int(r.get("timestamp"))
-        ts_dt = datetime.utcfromtimestamp(ts) if isinstance(ts, int) else None
-        user_id = to_int(r.get("userId"))
-        if user_id is None or rating is None:
-            continue
-        docs.append({"userId": user_id, "movie_tmdb": tmdb, "rating": rating, "timestamp": ts_dt})
-
-        if not tqdm and len(docs) % 20000 == 0:
-            logger.info(f"Prepared {len(docs)} rating docs so far...")
-
-    return docs
-
+        db["movies"].drop()
+    coll = db["movies"]
 
-def import_ratings(db, rating_docs: List[Dict], *, drop_first: bool = True, batch_size: int = 5000):
-    coll = db["ratings"]
+    ops = (UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True) for doc in movie_docs)
+    total = bulk_write_concurrently(coll, ops, batch_size=batch_size, label="Movies upserted")
+    print(f"Upserted {total} movie documents.")
+    return total
+
+
+def load_ratings(data_dir: Path, movieId_to_tmdb: Dict[int, int],
+                 genres_by_tmdb: Dict[int, List[str]]) -> Iterator[Dict]:
+    ratings_path = data_dir / "ratings_merged_cleaned.parquet"
+    # Stream the Parquet file in ~1M-row RecordBatches instead of loading it whole
+    reader = pq.ParquetFile(ratings_path).iter_batches(batch_size=1 << 20)
+
+    prepared = 0
+    last_report = time.monotonic()
+    pbar = tqdm(desc="load_ratings", unit="row") if tqdm else None
+    for batch in reader:
+        for r in batch.to_pylist():
+            ml_id = to_int(r.get("movieId"))
+            tmdb = movieId_to_tmdb.get(ml_id)
+            if not tmdb:
+                continue
+            rating = to_float(r.get("rating"))
+            ts = to_int(r.get("timestamp"))
+            ts_dt = datetime.utcfromtimestamp(ts) if isinstance(ts, int) else None
+            user_id = to_int(r.get("userId"))
+            if user_id is None or rating is None:
+                continue
+            prepared += 1
+            yield {"userId": user_id, "movie_tmdb": tmdb, "rating": rating, "timestamp": ts_dt,
+                   "genres": genres_by_tmdb.get(tmdb, [])}
+
+        if pbar:
+            pbar.update(batch.num_rows)
+        elif time.monotonic() - last_report >= PROGRESS_INTERVAL_S:
+            logger.info(f"Prepared {prepared} rating docs so far...")
+            last_report = time.monotonic()
+    if pbar:
+        pbar.close()
+
+
+def import_ratings(db, rating_docs: Iterable[Dict], *, drop_first: bool = True, batch_size: int = 50000) -> int:
     if drop_first:
         logger.info("Dropping collection 'ratings'...")
-        coll.drop()
-
-    ops, total = [], 0
-    for i, doc in enumerate(rating_docs, 1):
-        ops.append(UpdateOne(
-            {"userId": doc["userId"], "movie_tmdb": doc["movie_tmdb"]},
-            {"$set": doc},
-            upsert=True
-        ))
-        if len(ops) >= batch_size:
-            coll.bulk_write(ops, ordered=False)
-            total += len(ops)
-            logger.info(f"Ratings upserted: {total}")
-            ops = []
-    if ops:
-        coll.bulk_write(ops, ordered=False)
-        total += len(ops)
-        logger.info(f"Ratings upserted (final): {total}")
-
-
-def create_indexes(db):
-    movies = db["movies"]
-    ratings = db["ratings"]
-
-    # Text search for noir queries
-    movies.create_index([("overview", TEXT), ("tagline", TEXT)], name="movies_text")
-    logger.info("Created text index")
-
-    # Director / crew queries
-    movies.create_index([("crew.job", ASCENDING), ("crew.id", ASCENDING)], name="idx_crew_job_id")
-
-    # Cast-based queries (co-stars, top-5, gender)
-    movies.create_index([("cast.id", ASCENDING)], name="idx_cast_id")
-    movies.create_index([("cast.order", ASCENDING)], name="idx_cast_order")
-    movies.create_index([("cast.gender", ASCENDING)], name="idx_cast_gender")
-
-    # Collections and revenue aggregations
-    movies.create_index([("belongs_to_collection.name", ASCENDING)], name="idx_collection_name")
-    movies.create_index([("revenue", DESCENDING)], name="idx_revenue_desc")
-
-    # Genres and primary genre
-    movies.create_index([("genres.name", ASCENDING)], name="idx_genres_name")
-    movies.create_index([("primary_genre", ASCENDING)], name="idx_primary_genre")
-
-    # Time-based aggregations
-    movies.create_index([("year", ASCENDING)], name="idx_year")
-    movies.create_index([("decade", ASCENDING)], name="idx_decade")
-    movies.create_index([("release_date", ASCENDING)], name="idx_release_date")
-
-    # Voting filters and sorts
-    movies.create_index([("vote_count", DESCENDING), ("vote_average", DESCENDING)], name="idx_votes_combo")
-
-    # Language / US production filters
-    movies.create_index([("original_language", ASCENDING)], name="idx_original_language")
-    movies.create_index([("production_companies.name", ASCENDING)], name="idx_prod_companies_name")
-    movies.create_index([("production_countries.iso_3166_1", ASCENDING)], name="idx_prod_countries_code")
-
-    # Ratings-side indexes
-    ratings.create_index([("userId", ASCENDING)], name="idx_ratings_user")
-    ratings.create_index([("movie_tmdb", ASCENDING)], name="idx_ratings_movie")
-    ratings.create_index([("userId", ASCENDING), ("movie_tmdb", ASCENDING)], unique=True, name="idx_user_movie_unique")
-    logger.info("Indexes created.")
+        db["ratings"].drop()
+    coll = db["ratings"]
+
+    if drop_first:
+        # Fresh collection and movie_cleaning keeps one rating per (userId, movie_tmdb): plain
+        # inserts, no per-op match against an unindexed collection
+        ops = (InsertOne(doc) for doc in rating_docs)
+        return bulk_write_concurrently(coll, ops, batch_size=batch_size, label="Ratings inserted")
+
+    ops = (UpdateOne(
+        {"userId": doc["userId"], "movie_tmdb": doc["movie_tmdb"]},
+        {"$set": doc},
+        upsert=True
+    ) for doc in rating_docs)
+    return bulk_write_concurrently(coll, ops, batch_size=batch_size, label="Ratings upserted")
+
+
+def create_movie_indexes(db):
+    # All movie indexes are submitted in a single createIndexes command
+    # The noir query's text / trigram indexes live on movies_skinny (build_movies_skinny), the
+    # only collection it reads
+    db["movies"].create_indexes([
+        # Director / crew queries
+        IndexModel([("crew.job", ASCENDING), ("crew.id", ASCENDING)], name="idx_crew_job_id"),
+        # Director-actor pairs: only movies with a director, ordered for the vote_count >= 100 range
+        IndexModel([("crew.job", ASCENDING), ("vote_count", DESCENDING)], name="idx_directed_votes",
+                   partialFilterExpression={"crew.job": "Director"}),
+
+        # Cast-based queries (co-stars, top-5, gender)
+        IndexModel([("cast.id", ASCENDING)], name="idx_cast_id"),
+        IndexModel([("cast.order", ASCENDING)], name="idx_cast_order"),
+        IndexModel([("cast.gender", ASCENDING)], name="idx_cast_gender"),
+
+        # Collections and revenue aggregations
+        IndexModel([("belongs_to_collection.name", ASCENDING)], name="idx_collection_name"),
+        IndexModel([("revenue", DESCENDING)], name="idx_revenue_desc"),
+
+        # Genres and primary genre
+        IndexModel([("genres.name", ASCENDING)], name="idx_genres_name"),
+        IndexModel([("primary_genre", ASCENDING)], name="idx_primary_genre"),
+
+        # Time-based aggregations
+        IndexModel([("year", ASCENDING)], name="idx_year"),
+        # Decade x primary genre runtimes: covers the whole match + group, and its decade prefix
+        # serves decade-only filters
+        IndexModel([("decade", ASCENDING), ("primary_genre", ASCENDING), ("runtime", ASCENDING)],
+                   name="idx_decade_genre_runtime"),
+        IndexModel([("release_date", ASCENDING)], name="idx_release_date"),
+
+        # Voting filters and sorts
+        IndexModel([("vote_count", DESCENDING), ("vote_average", DESCENDING)], name="idx_votes_combo"),
+
+        # Language / US production filters
+        IndexModel([("original_language", ASCENDING)], name="idx_original_language"),
+        IndexModel([("production_companies.name", ASCENDING)], name="idx_prod_companies_name"),
+        IndexModel([("production_countries.iso_3166_1", ASCENDING)], name="idx_prod_countries_code"),
+    ])
+    logger.info("Movie indexes created.")
+
+
+def _letter_trigrams_expr(text) -> Dict:
+    """Aggregation expression for the distinct letter-only trigrams of a lowercase string.
+
+    Trigrams spanning spaces/punctuation are dropped to bound the array size; a word regex
+    like \\bnoir\\b only ever needs the in-word trigrams "noi" and "oir".
+    """
+    return {"$let": {"vars": {"t": {"$ifNull": [text, ""]}}, "in": {"$setUnion": [{"$filter": {
+        "input": {"$map": {
+            "input": {"$range": [0, {"$max": [0, {"$subtract": [{"$strLenCP": "$$t"}, 2]}]}]},
+            "as": "i", "in": {"$substrCP": ["$$t", "$$i", 3]},
+        }},
+        "as": "g", "cond": {"$regexMatch": {"input": "$$g", "regex": r"^\p{L}{3}$"}},
+    }}]}}}
+
+
+def build_movies_skinny(db):
+    """Materialize movies_skinny: the fields the vote-filtered queries (noir, director-actor pairs,
+    US-involved languages) read, with cast/crew trimmed to what their group keys need.
+    Re-run after a reload to refresh it."""
+    db["movies_skinny"].drop()
+    db["movies"].aggregate([
+        {"$project": {
+            "title": 1, "year": 1, "vote_average": 1, "vote_count": 1, "revenue": 1,
+            "overview": 1, "tagline": 1,
+            # Lowercased copies so the noir fallback can use case-sensitive regexes (no $options "i");
+            # derived here rather than stored on movies, which never reads them
+            "overview_lc": {"$toLower": "$overview"},
+            "tagline_lc": {"$toLower": "$tagline"},
+            "keywords": {"$map": {"input": {"$ifNull": ["$keywords", []]}, "as": "k", "in": {"name": "$$k.name"}}},
+            "original_language": 1, "us_involved": 1,
+            "cast": {"$map": {"input": {"$ifNull": ["$cast", []]}, "as": "a",
+                              "in": {"id": "$$a.id", "name": "$$a.name"}}},
+            # Only directors are ever read from crew in these queries
+            "crew": {"$filter": {"input": {"$ifNull": ["$crew", []]}, "as": "c",
+                                 "cond": {"$eq": ["$$c.job", "Director"]}}},
+        }},
+        # Trigram prefilter for the noir regex fallback (idx_text_trigrams); keyword names are
+        # already lowercase
+        {"$addFields": {"text_trigrams": {"$setUnion": [
+            _letter_trigrams_expr("$overview_lc"),
+            _letter_trigrams_expr("$tagline_lc"),
+            {"$reduce": {"input": "$keywords.name", "initialValue": [],
+                         "in": {"$setUnion": ["$$value", _letter_trigrams_expr("$$this")]}}},
+        ]}}},
+        {"$merge": {"into": "movies_skinny", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True)
+    db["movies_skinny"].create_indexes([
+        IndexModel([("overview", TEXT), ("tagline", TEXT), ("keywords.name", TEXT)],
+                   name="movies_skinny_text", default_language="english"),
+        IndexModel([("text_trigrams", ASCENDING)], name="idx_text_trigrams"),
+        IndexModel([("crew.job", ASCENDING), ("vote_count", DESCENDING)], name="idx_directed_votes",
+                   partialFilterExpression={"crew.job": "Director"}),
+        IndexModel([("vote_count", DESCENDING), ("vote_average", DESCENDING)], name="idx_votes_combo"),
+        # Only US-involved movies are indexed; the languages query seeks straight into them
+        IndexModel([("us_involved", ASCENDING), ("original_language", ASCENDING)], name="idx_us_language",
+                   partialFilterExpression={"us_involved": True}),
+    ])
+    logger.info(f"movies_skinny built: {db['movies_skinny'].estimated_document_count()} docs.")
+
+
+def create_rating_indexes(db):
+    db["ratings"].create_indexes([
+        IndexModel([("userId", ASCENDING)], name="idx_ratings_user"),
+        IndexModel([("movie_tmdb", ASCENDING)], name="idx_ratings_movie"),
+        IndexModel([("userId", ASCENDING), ("movie_tmdb", ASCENDING)], unique=True, name="idx_user_movie_unique"),
+    ])
+    logger.info("Rating indexes created.")
 
 
 def main():
@@ -342,8 +510,8 @@ def main():
     base_dir = ROOT
     data_dir = base_dir / "cleaned_data"
 
-    # Connect to MongoDB using the provided connector
-    conn = DbConnector()
+    # Connect to MongoDB using the provided connector; a large pool serves the concurrent bulk writes
+    conn = DbConnector(maxPoolSize=200, minPoolSize=50)
     db = conn.db
 
     t0 = time.perf_counter()
@@ -354,32 +522,42 @@ def main():
         movieId_to_tmdb, tmdb_to_imdb = load_links_mapping(data_dir)
         logger.info(f"links: {len(movieId_to_tmdb)} ml->tmdb, {len(tmdb_to_imdb)} tmdb->imdb")
 
-        logger.info("Loading keywords and credits...")
-        kw_map = load_keywords_map(data_dir)
-        cast_map, crew_map = load_credits_maps(data_dir)
-        logger.info(f"keywords: {len(kw_map)}, cast: {len(cast_map)}, crew: {len(crew_map)}")
+        with ProcessPoolExecutor() as pool:
+            logger.info("Loading keywords and credits...")
+            kw_map = load_keywords_map(data_dir, pool)
+            credits_map = load_credits_map(data_dir, pool)
+            logger.info(f"keywords: {len(kw_map)}, credits: {len(credits_map)}")
 
-        logger.info("Building movie docs...")
-        t_build = time.perf_counter()
-        movie_docs = build_movie_docs(data_dir, tmdb_to_imdb, cast_map, crew_map, kw_map)
-        logger.info(f"Built {len(movie_docs)} movies in {time.perf_counter() - t_build:.1f}s")
+            logger.info("Loading movies metadata...")
+            meta = load_movies_metadata(data_dir, pool)
+        genres_by_tmdb = load_genre_names_map(meta)
 
-        logger.info("Importing movies...")
+        # Movie and rating docs are generated lazily and streamed into the bulk writes
+        logger.info("Building and importing movies...")
         t_movies = time.perf_counter()
-        import_movies(db, movie_docs, drop_first=True)
-        logger.info(f"Movies imported in {time.perf_counter() - t_movies:.1f}s")
-
-        logger.info("Preparing ratings...")
-        t_rprep = time.perf_counter()
-        rating_docs = load_ratings(data_dir, movieId_to_tmdb)
-        logger.info(f"Prepared {len(rating_docs)} ratings in {time.perf_counter() - t_rprep:.1f}s")
-
-        logger.info("Importing ratings...")
-        t_ratings = time.perf_counter()
-        import_ratings(db, rating_docs, drop_first=True)
-        logger.info(f"Ratings imported in {time.perf_counter() - t_ratings:.1f}s")
-
-        create_indexes(db)
+        movie_docs = build_movie_docs(meta, tmdb_to_imdb, credits_map, kw_map)
+        n_movies = import_movies(db, movie_docs, drop_first=True)
+        logger.info(f"Imported {n_movies} movies in {time.perf_counter() - t_movies:.1f}s")
+
+        # Build the movie indexes server-side while the ratings are still being loaded
+        with ThreadPoolExecutor(max_workers=1) as index_ex:
+            movie_indexes = index_ex.submit(create_movie_indexes, db)
+
+            logger.info("Preparing and importing ratings...")
+            t_ratings = time.perf_counter()
+            rating_docs = load_ratings(data_dir, movieId_to_tmdb, genres_by_tmdb)
+            n_ratings = import_ratings(db, rating_docs, drop_first=True)
+            logger.info(f"Imported {n_ratings} ratings in {time.perf_counter() - t_ratings:.1f}s")
+
+            create_rating_indexes(db)
+            movie_indexes.result()
+
+        logger.info("Building movies_skinny...")
+        build_movies_skinny(db)
+        # Report what the server holds; collection metadata gives this in O(1) where
+        # count_documents({}) would scan the freshly loaded collections
+        logger.info(f"Server counts: movies={db['movies'].estimated_document_count()}, "
+                    f"ratings={db['ratings'].estimated_document_count()}")
         logger.info(f"Done. Total time: {time.perf_counter() - t0:.1f}s")
     except BulkWriteError as bwe:
         logger.exception("Bulk write error")
@@ -1,20 +1,41 @@
 import os
 import ast
+import json
 from typing import List, Optional
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pac
 
-# ---- Load raw CSV files ----
-df_credits = pd.read_csv("data/credits.csv")
-df_keywords = pd.read_csv("data/keywords.csv")
-df_movies_metadata = pd.read_csv("data/movies_metadata.csv", low_memory=False)
-df_links_merged = pd.read_csv("data/links_merged.csv")
-df_ratings_merged = pd.read_csv("data/merged_ratings.csv")
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# movies_metadata.csv has mixed-type columns (e.g. dates in "id"), so it is read with a fixed
+# all-string schema instead of letting Arrow infer types from the first block
+MOVIES_METADATA_COLUMNS = [
+    "adult", "belongs_to_collection", "budget", "genres", "homepage", "id", "imdb_id",
+    "original_language", "original_title", "overview", "popularity", "poster_path",
+    "production_companies", "production_countries", "release_date", "revenue", "runtime",
+    "spoken_languages", "status", "tagline", "title", "video", "vote_average", "vote_count",
+]
 
 
 # ------------------------------- Utilities -------------------------------- #
 
+def _read_csv(path: str, column_types: Optional[dict] = None) -> pd.DataFrame:
+    """Read a CSV with Arrow's multithreaded parser; empty cells become NaN like pd.read_csv."""
+    table = pac.read_csv(
+        path,
+        parse_options=pac.ParseOptions(newlines_in_values=True),
+        convert_options=pac.ConvertOptions(column_types=column_types or {}, strings_can_be_null=True),
+    )
+    return table.to_pandas()
+
+
 def _find_id_column(df: pd.DataFrame) -> Optional[str]:
     """Return a likely id column name (case-sensitive match first), else None."""
     for c in ("id", "movie_id", "movieId"):
@@ -29,20 +50,17 @@ def _find_id_column(df: pd.DataFrame) -> Optional[str]:
 def _drop_empty_list_like(df: pd.DataFrame, column: str) -> pd.DataFrame:
     """Drop rows where column is NaN or '[]'."""
     if column not in df.columns:
-        return df.copy()
-    out = df.copy()
-    out = out[~out[column].isna()]
-    out = out[out[column].astype(str).str.strip() != "[]"]
-    return out
+        return df
+    # Boolean indexing already returns a new frame, no defensive copy needed.
+    # Raw cells are never padded, so an exact compare avoids stringifying/stripping every cell.
+    mask = df[column].notna() & df[column].ne("[]")
+    return df.loc[mask]
 
 
 def _drop_duplicates_by_id(df: pd.DataFrame) -> pd.DataFrame:
     """Drop duplicate rows by a likely id column, if one exists."""
-    out = df.copy()
-    id_col = _find_id_column(out)
-    if id_col:
-        out = out.drop_duplicates(subset=id_col)
-    return out
+    id_col = _find_id_column(df)
+    return df.drop_duplicates(subset=id_col) if id_col else df
 
 
 def _parse_genre_names(cell: object) -> List[str]:
@@ -58,6 +76,22 @@ def _parse_genre_names(cell: object) -> List[str]:
     return []
 
 
+def _genre_names_column(genres: pd.Series) -> pd.Series:
+    """Vectorized _parse_genre_names: decode each distinct cell once with a C JSON parser.
+
+    Genre cells are Python-literal lists of {'id', 'name'} dicts; swapping the quotes makes them
+    valid JSON. Cells that still fail to decode fall back to _parse_genre_names.
+    """
+    names_by_cell = {}
+    for cell in genres.dropna().drop_duplicates().tolist():
+        try:
+            parsed = _json_loads(cell.replace("'", '"'))
+            names_by_cell[cell] = [d["name"] for d in parsed if isinstance(d, dict) and d.get("name")]
+        except Exception:
+            names_by_cell[cell] = _parse_genre_names(cell)
+    return pd.Series([names_by_cell.get(c, []) for c in genres.tolist()], index=genres.index, dtype=object)
+
+
 # ------------------------------- Cleaners -------------------------------- #
 
 def clean_credits(df: pd.DataFrame) -> pd.DataFrame:
@@ -79,29 +113,24 @@ def clean_movies_metadata(df: pd.DataFrame) -> pd.DataFrame:
     out = _drop_duplicates_by_id(df)
     if "status" in out.columns:
         out = out[out["status"] == "Released"]
+    # New frame owned by this function; the runtime imputation below mutates it
+    out = out.reset_index(drop=True)
 
     if "runtime" not in out.columns:
-        return out.reset_index(drop=True)
+        return out
 
     out["runtime"] = pd.to_numeric(out["runtime"], errors="coerce")
     out.loc[out["runtime"] == 0, "runtime"] = np.nan
-    out["genre_list"] = out.get("genres", pd.Series([[]] * len(out))).apply(_parse_genre_names)
+    out["genre_list"] = _genre_names_column(out.get("genres", pd.Series([None] * len(out), index=out.index)))
 
     overall_median = out["runtime"].median(skipna=True)
     exploded = out.explode("genre_list")
-    genre_medians = exploded.groupby("genre_list")["runtime"].median().to_dict()
-
-    def _impute(row: pd.Series) -> float:
-        if pd.notna(row["runtime"]):
-            return row["runtime"]
-        gens = row["genre_list"] or []
-        vals = [genre_medians.get(g) for g in gens if genre_medians.get(g) is not None]
-        if vals:
-            return float(np.nanmedian(vals))
-        return float(overall_median) if pd.notna(overall_median) else np.nan
+    genre_medians = exploded.groupby("genre_list")["runtime"].median()
 
-    out["runtime"] = out.apply(_impute, axis=1)
-    return out.drop(columns=["genre_list"]).reset_index(drop=True)
+    # Per movie: median of its genres' medians, computed for all rows at once
+    per_row_genre_median = exploded["genre_list"].map(genre_medians).groupby(level=0).median()
+    out["runtime"] = out["runtime"].fillna(per_row_genre_median).fillna(overall_median)
+    return out.drop(columns=["genre_list"])
 
 
 # ------------------------------- Save cleaned versions -------------------------------- #
@@ -110,24 +139,53 @@ def clean_links_merged(df: pd.DataFrame) -> pd.DataFrame:
     """Clean links merged dataset."""
     return df
 
-def clean_ratings_merged(df: pd.DataFrame) -> pd.DataFrame:
-    """Clean ratings merged dataset."""
-    return df
-
-# Create folder if it doesn’t exist
-os.makedirs("cleaned_data", exist_ok=True)
-
-# Clean and save each relevant dataset
-clean_datasets = {
-    "credits": clean_credits(df_credits),
-    "keywords": clean_keywords(df_keywords),
-    "movies_metadata": clean_movies_metadata(df_movies_metadata),
-    "links_merged": clean_links_merged(df_links_merged),
-    "ratings_merged": clean_ratings_merged(df_ratings_merged),
-}
-
-# Save cleaned DataFrames
-for name, df_cleaned in clean_datasets.items():
-    output_path = f"cleaned_data/{name}_cleaned.csv"
-    df_cleaned.to_csv(output_path, index=False)
-    print(f"Saved cleaned {name} → {output_path}")
\ No newline at end of file
+def clean_ratings_merged(df: pd.DataFrame, links: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean ratings merged dataset.
+    Several MovieLens movieIds can map to one TMDB id, so a user can rate the same TMDB movie more
+    than once; only the last of those ratings (file order) is kept, as with per-rating upserts.
+    """
+    # Same movieId -> tmdbId mapping the importer builds (load_links_mapping)
+    movie_ids = pd.to_numeric(links["movieId"], errors="coerce")
+    tmdb_ids = pd.to_numeric(links["tmdbId"], errors="coerce")
+    valid = movie_ids.notna() & movie_ids.ne(0) & tmdb_ids.notna() & tmdb_ids.ne(0)
+    to_tmdb = pd.Series(tmdb_ids[valid].to_numpy(), index=movie_ids[valid].to_numpy())
+    to_tmdb = to_tmdb[~to_tmdb.index.duplicated(keep="last")]
+
+    tmdb = pd.to_numeric(df["movieId"], errors="coerce").map(to_tmdb)
+    # Only rows the importer would load take part, so a later unusable row cannot shadow a valid one
+    imported = tmdb.notna() & df["userId"].notna() & df["rating"].notna()
+    keys = pd.DataFrame({"userId": df["userId"], "tmdb": tmdb}).loc[imported]
+    return df.drop(index=keys.index[keys.duplicated(keep="last")])
+
+def main():
+    # ---- Load raw CSV files ----
+    df_credits = _read_csv("data/credits.csv")
+    df_keywords = _read_csv("data/keywords.csv")
+    df_movies_metadata = _read_csv(
+        "data/movies_metadata.csv", column_types={c: pa.string() for c in MOVIES_METADATA_COLUMNS}
+    )
+    df_links_merged = _read_csv("data/links_merged.csv")
+    df_ratings_merged = _read_csv("data/merged_ratings.csv")
+
+    # Create folder if it doesn’t exist
+    os.makedirs("cleaned_data", exist_ok=True)
+
+    # Clean and save each relevant dataset
+    clean_datasets = {
+        "credits": clean_credits(df_credits),
+        "keywords": clean_keywords(df_keywords),
+        "movies_metadata": clean_movies_metadata(df_movies_metadata),
+        "links_merged": clean_links_merged(df_links_merged),
+        "ratings_merged": clean_ratings_merged(df_ratings_merged, df_links_merged),
+    }
+
+    # Save cleaned DataFrames as Parquet: dtypes survive the round-trip and reads are multithreaded
+    for name, df_cleaned in clean_datasets.items():
+        output_path = f"cleaned_data/{name}_cleaned.parquet"
+        df_cleaned.to_parquet(output_path, engine="pyarrow", compression="zstd", compression_level=3, index=False)
+        print(f"Saved cleaned {name} → {output_path}")
+
+
+if __name__ == "__main__":
+    main()